@@ -12,6 +12,15 @@ reset:-
    assert(on(a,1,[])),
    assert(on(b,3,[])),
    assert(on(c,a,[])).
+
+% set_state(A,B,C) puts the blocks in any valid configuration, where Block a is
+% on A, Block b is on B, and Block c is on C. It is used to replay the current
+% configuration into a restarted Prolog server.
+set_state(A,B,C):-
+   retractall(on(_,_,[])),
+   assert(on(a,A,[])),
+   assert(on(b,B,[])),
+   assert(on(c,C,[])).
    
 % Compute all possible states of the blocks world
 % state(State) means that State is a valid configuration of blocks
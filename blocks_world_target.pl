@@ -13,6 +13,15 @@ reset:-
    assert(on(b,3,[])),
    assert(on(c,a,[])).
 
+% set_state(A,B,C) puts the blocks in any valid configuration, where Block a is
+% on A, Block b is on B, and Block c is on C. It is used to replay the current
+% configuration into a restarted Prolog server.
+set_state(A,B,C):-
+   retractall(on(_,_,[])),
+   assert(on(a,A,[])),
+   assert(on(b,B,[])),
+   assert(on(c,C,[])).
+
 state(State):-
   state_helper(Agent),   % three digit state
   state_helper(Target),  % another three digit state
@@ -0,0 +1,45 @@
+import numpy as np
+from blocksworld_env.envs.tables import state_pairs
+
+
+class AllGoalsQLearning:
+    """Off-policy Q-learning that learns every BlocksWorld-v1 target from each transition.
+
+    How the blocks move does not depend on the target, so one real move from a
+    configuration is a valid transition for all the targets at once. ``update`` applies it
+    to the whole [config, :, action] column of the Q-table in one vectorized step, with the
+    env's reward recomputed for each target: 100 when the move reaches it, -1 for any other
+    move and -10 when the move is not possible. ``qtable`` is the usual
+    (num_states, num_actions) table, like a Checkpoint's, indexed through ``state_table``.
+    """
+
+    def __init__(self, qtable, tables, alpha=0.1, gamma=0.9):
+        self.qtable = qtable
+        self.alpha = alpha
+        self.gamma = gamma
+        self.state_table = np.asarray(tables['state_table'])
+        if len(qtable) != self.state_table.size:
+            # like the canonical Q-table of SymmetryReduction, which has a row per class instead
+            raise ValueError(f"All-goals Q-learning needs one Q-table row for each of the "
+                             f"{self.state_table.size} states, got {len(qtable)}")
+        self.next_configs = np.asarray(tables['next_configs'])
+        self.config, self.target = state_pairs(self.state_table)
+        self.targets = np.arange(len(self.state_table))
+
+    def update(self, state, action, next_state):
+        # state and next_state are the env's observations before and after action
+        config = self.config[state]
+        next_config = self.config[next_state]
+        # the target row of the configuration is its terminal state, nothing to learn there
+        targets = self.targets[self.targets != config]
+        rows = self.state_table[config, targets]
+        next_rows = self.state_table[next_config, targets]
+
+        reached = targets == next_config
+        if next_config == config:
+            reward = np.full(len(targets), -10.0)
+        else:
+            reward = np.where(reached, 100.0, -1.0)
+        # Q(S, A) <-  Q(S, A) + alpha * [ R +  gamma * (max Q(S', a)) -  Q(S, A)], for every target
+        value = reward + self.gamma * np.where(reached, 0.0, self.qtable[next_rows].max(axis=1))
+        self.qtable[rows, action] += self.alpha * (value - self.qtable[rows, action])
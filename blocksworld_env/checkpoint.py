@@ -0,0 +1,181 @@
+import json
+import os
+import shutil
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+def fsync_dir(path):
+    # make a rename inside the directory durable
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path, data):
+    # write next to the target, make it durable, then swap it in with one rename
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+def save_atomic(path, array):
+    # same as write_atomic, for a .npy file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        np.save(file, array)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+def open_qtable(path):
+    # read-only view of a live Q-table, for evaluation while training is still running
+    return open_memmap(os.path.join(path, 'qtable.npy'), mode='r')
+
+
+class Checkpoint:
+    """Q-table, visit counts, RNG states and ε schedule of a tabular agent, kept on disk.
+
+    Training updates memory-mapped live copies of the Q-table and visit counts
+    (``qtable.npy`` and ``visits.npy``) in place, so other processes can read the live
+    table without copying it. Every ``snapshot_every`` episodes the tables are copied to
+    their own snapshot files, each written to a temporary file, fsynced and renamed, then
+    ``meta.json`` is replaced atomically to point at them together with the episode, ε and
+    RNG states. With ``resume`` set, the run reloads the live tables from the snapshot
+    ``meta.json`` names, never from the live files, which may hold updates from after the
+    snapshot; otherwise it starts over in the same directory.
+    """
+
+    def __init__(self, path, num_states, num_actions, epsilon=0.1, decay=0.0, seed=None, snapshot_every=100,
+                 resume=False):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.rngs = {}
+        self.metrics = []
+        meta_path = os.path.join(path, 'meta.json')
+
+        if resume and os.path.exists(meta_path):
+            with open(meta_path) as file:
+                self.meta = json.load(file)
+            if (self.meta['start_epsilon'], self.meta['decay']) != (epsilon, decay):
+                # the ε schedule would silently be the old one
+                raise ValueError(f"Checkpoint in {path} was started with epsilon={self.meta['start_epsilon']}, "
+                                 f"decay={self.meta['decay']}, got epsilon={epsilon}, decay={decay}")
+            self.episode = self.meta['episode']
+            self.start_epsilon = self.meta['start_epsilon']
+            self.epsilon = self.meta['epsilon']
+            self.decay = self.meta['decay']
+            self.resumed = True
+        else:
+            self.meta = {'rngs': {}}
+            if os.path.exists(meta_path):
+                # an earlier run's snapshot stays valid until the first snapshot of this one
+                # replaces it, then its files are removed like any previous snapshot
+                with open(meta_path) as file:
+                    previous = json.load(file)
+                self.meta.update(snapshot=previous['snapshot'], tables=previous['tables'])
+            self.episode = 0
+            self.start_epsilon = epsilon
+            self.epsilon = epsilon
+            self.decay = decay
+            self.resumed = False
+
+        # the agent's own generator, for ε-greedy choices and the initial Q-values
+        self.rng = self.track_rng('agent', np.random.default_rng(seed))
+        if self.resumed:
+            # the live tables start over from the snapshot, one copy of each file: resuming
+            # is O(size of the tables), the snapshot itself is never mapped writable
+            snapshots = {name: os.path.join(path, filename) for name, filename in self.meta['tables'].items()}
+            shape = open_memmap(snapshots['qtable'], mode='r').shape
+            if shape != (num_states, num_actions):
+                raise ValueError(f"Checkpoint in {path} has a {shape} Q-table, "
+                                 f"expected {(num_states, num_actions)}")
+            self.qtable = self.open_live('qtable', snapshots['qtable'])
+            self.visits = self.open_live('visits', snapshots['visits'])
+        else:
+            self.qtable = self.open_live('qtable', self.rng.random((num_states, num_actions)))
+            self.visits = self.open_live('visits', np.zeros((num_states, num_actions), dtype=np.int64))
+            self.snapshot()
+
+    def open_live(self, name, initial):
+        # build the live table under a temporary name and rename it over the previous one, so
+        # processes reading the old live file keep a complete table instead of one truncated
+        # under them; initial is a snapshot file to copy or an array
+        live_path = os.path.join(self.path, f'{name}.npy')
+        tmp_path = live_path + '.tmp'
+        if isinstance(initial, str):
+            shutil.copyfile(initial, tmp_path)
+        else:
+            with open(tmp_path, 'wb') as file:
+                np.save(file, initial)
+        os.replace(tmp_path, live_path)
+        return open_memmap(live_path, mode='r+')
+
+    def track_rng(self, name, generator):
+        # restore the generator when resuming, and save its state with every snapshot,
+        # e.g. checkpoint.track_rng('env', env.unwrapped.np_random)
+        if name in self.meta['rngs']:
+            generator.bit_generator.state = self.meta['rngs'][name]
+        self.rngs[name] = generator
+        return generator
+
+    def track_metrics(self, sink):
+        # flush a MetricsSink before every snapshot, so its rows never fall behind the
+        # episode a resumed run continues from
+        self.metrics.append(sink)
+        return sink
+
+    def visit(self, state, action):
+        self.visits[state, action] += 1
+
+    def end_episode(self):
+        # The more we learn, the less we take random actions
+        self.episode += 1
+        self.epsilon -= self.decay * self.epsilon
+        if self.episode % self.snapshot_every == 0:
+            self.snapshot()
+
+    def snapshot(self):
+        # copy the tables to durable files of their own first, then point meta.json at them;
+        # the files are numbered, so a snapshot never overwrites the ones meta.json names
+        for sink in self.metrics:
+            sink.flush(sync=True)
+        previous = self.meta.get('tables', {})
+        number = self.meta.get('snapshot', 0) + 1
+        tables = {'qtable': f'qtable-{number}.npy', 'visits': f'visits-{number}.npy'}
+        save_atomic(os.path.join(self.path, tables['qtable']), self.qtable)
+        save_atomic(os.path.join(self.path, tables['visits']), self.visits)
+        self.meta = {
+            'episode': self.episode,
+            'start_epsilon': self.start_epsilon,
+            'epsilon': self.epsilon,
+            'decay': self.decay,
+            'rngs': {name: generator.bit_generator.state for name, generator in self.rngs.items()},
+            'snapshot': number,
+            'tables': tables,
+        }
+        write_atomic(os.path.join(self.path, 'meta.json'), json.dumps(self.meta))
+
+        # the previous snapshot is not referenced any more
+        for filename in previous.values():
+            os.remove(os.path.join(self.path, filename))
+
+    def close(self):
+        self.snapshot()
+        del self.qtable
+        del self.visits
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,269 @@
+import argparse
+import ipaddress
+import multiprocessing as mp
+import os
+import queue
+import socket
+import threading
+import time
+from multiprocessing.connection import Client, Listener, wait
+import gymnasium as gym
+import numpy as np
+
+# default secret for the actor and learner connections, only accepted on loopback: the
+# connections unpickle what they receive, so anyone knowing the key can run code
+AUTHKEY = b'blocksworld'
+
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def check_authkey(address, authkey):
+    # refuse the public default key where other machines can connect
+    if authkey == AUTHKEY and not (isinstance(address, tuple) and is_loopback(address[0])):
+        raise ValueError(f"{address} is not a loopback address, pass a secret authkey")
+
+
+def authkey_from_args(parser, host, authkey):
+    # --authkey is optional on loopback only
+    if authkey is not None:
+        return authkey.encode()
+    if not is_loopback(host):
+        parser.error(f"--authkey is required when {host} is not a loopback address")
+    return AUTHKEY
+
+
+def transition_buffer(size):
+    return {
+        'state': np.empty(size, dtype=np.int64),
+        'action': np.empty(size, dtype=np.int64),
+        'reward': np.empty(size, dtype=np.float32),
+        'next_state': np.empty(size, dtype=np.int64),
+        'done': np.empty(size, dtype=bool),
+    }
+
+
+def run_actor(address, env_id="blocksworld_env/BlocksWorld-v1", batch_size=256, epsilon=0.1, seed=None,
+              env_kwargs=None, authkey=AUTHKEY):
+    # Step one env with the latest greedy policy from the learner and stream the
+    # transitions to it in batches, until the learner says stop
+    check_authkey(address, authkey)
+    env = gym.make(env_id, **(env_kwargs or {}))
+    rng = np.random.default_rng(seed)
+    conn = Client(address, authkey=authkey)
+    try:
+        # tell the learner how large the Q-table is, it answers with the first policy
+        conn.send(('hello', (env.observation_space.n, env.action_space.n)))
+        _, policy = conn.recv()
+
+        state, _ = env.reset(seed=seed)
+        accumulated_reward, steps = 0, 0
+        in_flight = False
+        while True:
+            batch = transition_buffer(batch_size)
+            episode_rewards, episode_steps = [], []
+            for i in range(batch_size):
+                # ε-greedy on the synced policy
+                if rng.random() < epsilon:
+                    action = int(rng.integers(env.action_space.n))
+                else:
+                    action = int(policy[state])
+                next_state, reward, terminated, truncated, _ = env.step(action)
+                batch['state'][i] = state
+                batch['action'][i] = action
+                batch['reward'][i] = reward
+                batch['next_state'][i] = next_state
+                batch['done'][i] = terminated
+
+                accumulated_reward += reward
+                steps += 1
+                if terminated or truncated:
+                    episode_rewards.append(accumulated_reward)
+                    episode_steps.append(steps)
+                    accumulated_reward, steps = 0, 0
+                    state, _ = env.reset()
+                else:
+                    state = next_state
+
+            # one batch in flight: read the learner's answer to the previous batch
+            # before sending this one, so neither side can block the other
+            if in_flight:
+                message, payload = conn.recv()
+                if message == 'stop':
+                    return
+                if message == 'policy':
+                    policy = payload
+            conn.send(('batch', batch, (np.array(episode_rewards), np.array(episode_steps))))
+            in_flight = True
+    finally:
+        conn.close()
+        env.close()
+
+
+def accept_actors(listener, num_actors, actors=(), timeout=None):
+    # Accept num_actors connections, but give up when one of the actor processes exits
+    # before connecting (like a failed env or swipl launch) or after timeout seconds,
+    # instead of blocking in accept() forever
+    accepted = queue.Queue()
+
+    def accept():
+        try:
+            for _ in range(num_actors):
+                accepted.put(listener.accept())
+        except OSError as error:
+            # the listener was closed under us
+            accepted.put(error)
+
+    threading.Thread(target=accept, daemon=True).start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    connections = []
+    try:
+        while len(connections) < num_actors:
+            try:
+                conn = accepted.get(timeout=0.1)
+            except queue.Empty:
+                # actors only exit after the learner says stop, any exit now is a failure
+                for actor in actors:
+                    if actor.exitcode is not None:
+                        raise RuntimeError(f"Actor {actor.name} exited with code {actor.exitcode} before connecting")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"Only {len(connections)} of {num_actors} actors connected within {timeout}s")
+                continue
+            if isinstance(conn, Exception):
+                raise conn
+            connections.append(conn)
+    except BaseException:
+        for conn in connections:
+            conn.close()
+        raise
+    return connections
+
+
+class Learner:
+    """Tabular Q-learning on transition batches streamed in by actor processes.
+
+    Actors connect through ``multiprocessing.connection``, which works over loopback for
+    local runs and over TCP across machines. Every ``sync_every`` batches an actor gets
+    the current greedy policy back.
+    """
+
+    def __init__(self, alpha=0.1, gamma=0.9, sync_every=4, qtable=None, metrics=None, seed=None):
+        self.alpha = alpha
+        self.gamma = gamma
+        self.sync_every = sync_every
+        self.qtable = qtable
+        self.metrics = metrics
+        # for the initial Q-values when no qtable is given
+        self.rng = np.random.default_rng(seed)
+        self.steps = 0
+
+    def policy(self):
+        # actors only need the greedy action, which is much smaller than the Q-table
+        return self.qtable.argmax(axis=1).astype(np.int16)
+
+    def update(self, batch):
+        qtable = self.qtable
+        for state, action, reward, next_state, done in zip(batch['state'], batch['action'], batch['reward'],
+                                                          batch['next_state'], batch['done']):
+            # Q(S, A) <-  Q(S, A) + alpha * [ R +  gamma * (max Q(S', a)) -  Q(S, A)]
+            target = reward if done else reward + self.gamma * qtable[next_state].max()
+            qtable[state, action] += self.alpha * (target - qtable[state, action])
+        self.steps += len(batch['state'])
+
+    def serve(self, listener, num_actors, total_steps, actors=(), accept_timeout=None):
+        # actors are the local actor processes, if any, watched while they connect
+        connections = accept_actors(listener, num_actors, actors, accept_timeout)
+        for conn in connections:
+            _, (num_states, num_actions) = conn.recv()
+            if self.qtable is None:
+                self.qtable = self.rng.random((num_states, num_actions))
+            conn.send(('policy', self.policy()))
+
+        batches = {conn: 0 for conn in connections}
+        active = list(connections)
+        while active:
+            for conn in wait(active):
+                try:
+                    _, batch, (episode_rewards, episode_steps) = conn.recv()
+                except EOFError:
+                    active.remove(conn)
+                    continue
+
+                self.update(batch)
+                if self.metrics is not None:
+                    for reward, steps in zip(episode_rewards, episode_steps):
+                        self.metrics.append(reward, steps)
+
+                batches[conn] += 1
+                if self.steps >= total_steps:
+                    conn.send(('stop', None))
+                    active.remove(conn)
+                elif batches[conn] % self.sync_every == 0:
+                    conn.send(('policy', self.policy()))
+                else:
+                    conn.send(('ok', None))
+
+        for conn in connections:
+            conn.close()
+        return self.qtable
+
+
+def run_local(num_actors=4, total_steps=100_000, env_id="blocksworld_env/BlocksWorld-v1", batch_size=256,
+              epsilon=0.1, seed=0, env_kwargs=None, learner=None):
+    # Learner in this process, actors in their own processes, all over loopback
+    learner = Learner(seed=seed) if learner is None else learner
+    context = mp.get_context('spawn')
+    # a fresh secret for this run, handed to the actors directly
+    authkey = os.urandom(32)
+    with Listener(('localhost', 0), authkey=authkey) as listener:
+        actors = [context.Process(target=run_actor,
+                                  args=(listener.address, env_id, batch_size, epsilon, seed + i, env_kwargs, authkey))
+                  for i in range(num_actors)]
+        for actor in actors:
+            actor.start()
+        try:
+            qtable = learner.serve(listener, num_actors, total_steps, actors=actors)
+        finally:
+            for actor in actors:
+                actor.join(timeout=10)
+                if actor.is_alive():
+                    actor.terminate()
+    return qtable
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Actor/learner Q-learning on the blocks world")
+    parser.add_argument('role', choices=['local', 'learner', 'actor'])
+    parser.add_argument('--env', default="blocksworld_env/BlocksWorld-v1")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6000)
+    parser.add_argument('--actors', type=int, default=4)
+    parser.add_argument('--steps', type=int, default=100_000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--epsilon', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--authkey', default=None, help="shared secret, required unless --host is loopback")
+    parser.add_argument('--output', default='qtable.npy')
+    parser.add_argument('--accept-timeout', type=float, default=None,
+                        help="seconds the learner waits for all actors to connect")
+    args = parser.parse_args()
+    authkey = authkey_from_args(parser, args.host, args.authkey)
+
+    if args.role == 'actor':
+        run_actor((args.host, args.port), args.env, args.batch_size, args.epsilon, args.seed, authkey=authkey)
+        return
+
+    if args.role == 'learner':
+        with Listener((args.host, args.port), authkey=authkey) as listener:
+            qtable = Learner(seed=args.seed).serve(listener, args.actors, args.steps, accept_timeout=args.accept_timeout)
+    else:
+        qtable = run_local(args.actors, args.steps, args.env, args.batch_size, args.epsilon, args.seed)
+    np.save(args.output, qtable)
+
+
+if __name__ == "__main__":
+    main()
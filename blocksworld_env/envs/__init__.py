@@ -1,2 +1,3 @@
 from blocksworld_env.envs.blocks_world import BlocksWorldEnv
-from blocksworld_env.envs.blocks_world_target import BlocksWorldTargetEnv
\ No newline at end of file
+from blocksworld_env.envs.blocks_world_target import BlocksWorldTargetEnv
+from blocksworld_env.envs.tables import SharedTables
@@ -1,56 +1,44 @@
 from enum import Enum
 import gymnasium as gym
 from gymnasium import spaces
-import pygame
 import numpy as np
-import random
-from screen import Display
-from swiplserver import PrologMQI,PrologThread
+from screen import AsyncDisplay, Display
+from blocksworld_env.envs.prolog import PrologBackend
+from blocksworld_env.envs.tables import (SharedTables, alias_table, publish_tables, query_actions, query_states,
+                                         query_transitions, sample_alias)
 
 class BlocksWorldEnv(gym.Env):
-    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4}
-
-    def __init__(self, render_mode=None, size=5):
-        # Run Prolog interpreter and load blocks world
-        self.mqi = PrologMQI()
-        self.prolog_thread = self.mqi.create_thread()
-        result = self.prolog_thread.query('[blocks_world]')
-        if not result:
-            raise RuntimeError("Could not load blocks_world.pl.")
-
-        # Calling query to return all of the possible states
-        prolog_states = self.prolog_thread.query('state(State)')
+    metadata = {"render_modes": ["human", "human_async", "rgb_array"], "render_fps": 4}
+
+    def __init__(self, render_mode=None, size=5, start_distribution=None, start_weights=None, shared_tables=None,
+                 query_timeout=5.0, max_retries=2):
+        # nothing to replay into a restarted Prolog server until reset
+        self.state = None
+        self.display = None
+        # False after set_state, until the next step puts Prolog in the restored state
+        self.prolog_synced = True
+
+        # Run Prolog interpreter and load blocks world, every query has a deadline and
+        # a hung or crashed server is restarted with the current configuration
+        self.prolog = PrologBackend('blocks_world', query_timeout=query_timeout, max_retries=max_retries,
+                                    restore=self.restore_prolog_state)
+
+        if shared_tables is None:
+            # Build the state and action tables from Prolog
+            self.tables = self.build_tables(self.prolog)
+        else:
+            # Attach to the tables the parent process already published, without copying them
+            self.tables = SharedTables.attach(shared_tables)
+
+        # state strings indexed by the state integer, like 'bc2'
+        self.state_strs = self.tables['states']
         # construct the state dictionary
         # will create a dict like:
         # {’bc2’:0, ’bc3’:1, …,…}
-        self.states_dict = {state['State']: index for index, state in enumerate(prolog_states)}
-
-        # Set up a dictionary to convert action numbers into prolog actions
-        self.actions_dict = {}
-        # Call query action(A) to get all actions
-        result = self.prolog_thread.query("action(A)")
-        # result is like this, where the first action is move(a,b,c)
-        # [{'A': {'args': ['a', 'b', 'c'], 'functor': 'move'}},...]
-        for i, A in enumerate(result):
-            # get the action name (as a functor)
-            if isinstance(A['A'], str):  # case where {'A': '_'}
-                break
-            else:
-                action_string = A['A']['functor']
-                # indicate the first argument
-                first = True
-                for arg in A['A']['args']:
-                    if first:
-                        # already have a first, next will not be first
-                        first = False
-                        action_string += '('
-                    else:
-                        action_string += ','
-
-                    # concat all arguments into functor predicate
-                    action_string += str(arg)
-                action_string += ')'
-                self.actions_dict[i] = action_string
+        self.states_dict = {str(state_str): index for index, state_str in enumerate(self.state_strs)}
+
+        # Set up a dictionary to convert action numbers into prolog actions, like move(a,b,c)
+        self.actions_dict = {index: str(action) for index, action in enumerate(self.tables['actions'])}
 
         # Observation space is the length of state dict
         self.observation_space = spaces.Discrete(len(self.states_dict))
@@ -66,47 +54,134 @@ class BlocksWorldEnv(gym.Env):
         # choose random target which is not the start state
         self.target_state_str = self.get_random_target_state() # will set self.target_state to a random state string
         self.target_state = self.states_dict[self.target_state_str]
+        # episodes start from Prolog's reset state unless a start distribution is set
+        self.set_start_distribution(start_distribution, start_weights)
         # render mode
 
-        # Initialize PyGame display if render_mode is "human"
+        # Initialize PyGame display if render_mode is "human", "human_async" draws in its own
+        # process at render_fps and never makes the env wait for the screen
         self.render_mode = render_mode
         if self.render_mode == "human":
             self.display = Display()
-
-        self.window = None
-        self.clock = None
+        elif self.render_mode == "human_async":
+            self.display = AsyncDisplay(fps=self.metadata["render_fps"])
+
+    @staticmethod
+    def build_tables(prolog):
+        states = query_states(prolog)
+        actions = query_actions(prolog)
+        return {
+            'states': states,
+            'actions': actions,
+            # next_configs[state, action] is the state the action leads to, -1 if not possible
+            'next_configs': query_transitions(prolog, states, actions),
+        }
+
+    @classmethod
+    def publish_tables(cls, name=None):
+        # Build the tables once and put them in shared memory, pass tables.handle to
+        # the workers as the shared_tables argument and close the tables after training
+        return publish_tables('blocks_world', cls.build_tables, name=name)
+
+    def restore_prolog_state(self):
+        # Replay the current configuration into a restarted Prolog server
+        if self.state is not None:
+            self.prolog.run(f"set_state({','.join(self.get_state_str(self.state))})")
+
+    def sync_prolog_state(self):
+        # Put Prolog in the current state, once, after a set_state
+        if not self.prolog_synced:
+            self.prolog.query(f"set_state({','.join(self.get_state_str(self.state))})")
+            self.prolog_synced = True
+
+    def get_state(self):
+        # Snapshot of everything an episode depends on: the state, the target and the env's
+        # generator. Nothing is asked from Prolog, so it is O(1)
+        return {'state': self.state, 'target': self.target_state, 'rng': self.np_random.bit_generator.state}
+
+    def set_state(self, snapshot):
+        # Restore a get_state snapshot in O(1); Prolog only catches up on the next step
+        self.state = int(snapshot['state'])
+        self.target_state = int(snapshot['target'])
+        self.target_state_str = self.get_state_str(self.target_state)
+        if 'rng' in snapshot:
+            self.np_random.bit_generator.state = snapshot['rng']
+        self.prolog_synced = False
+
+        if self.display is not None:
+            self.display.target = self.target_state_str
+            self.display.step(self.get_state_str(self.state))
+        return self.state
+
+    def set_start_distribution(self, start_distribution=None, start_weights=None):
+        # None: Prolog's reset state; "uniform": every state; "weighted": one weight per state
+        # in start_weights (like inverse visit counts, for exploring starts); or a list of
+        # states (indices or strings like '13a') to draw from. The alias table is built once
+        # here, so reset draws a start in O(1)
+        self.start_distribution = start_distribution
+        num_states = len(self.state_strs)
+        if start_distribution is None:
+            self.start_alias = None
+            return
+        if isinstance(start_distribution, str) and start_distribution == "uniform":
+            weights = np.ones(num_states)
+        elif isinstance(start_distribution, str) and start_distribution == "weighted":
+            if start_weights is None or len(start_weights) != num_states:
+                raise ValueError(f"start_weights must give one weight for each of the {num_states} states")
+            weights = start_weights
+        elif isinstance(start_distribution, str):
+            raise ValueError(f"Unknown start distribution: {start_distribution}")
+        else:
+            starts = [self.states_dict[start] if isinstance(start, str) else int(start) for start in start_distribution]
+            weights = np.bincount(starts, minlength=num_states)
+        self.start_alias = alias_table(weights)
 
     def get_random_target_state(self):
-        # Choose a random state that is not the initial state
-        possible_targets = [state for state in self.states_dict.keys() if state != self.initial_state_str]
-        return random.choice(possible_targets)
+        # Choose a random state that is not the start state, using the env's seeded generator
+        target_state = int(self.np_random.integers(len(self.state_strs) - 1))
+        # skip over the start state so every other state is equally likely
+        if target_state >= self.state:
+            target_state += 1
+        return self.get_state_str(target_state)
 
     def get_state_str(self, state_int):
-        return list(self.states_dict.keys())[list(self.states_dict.values()).index(state_int)]
+        return str(self.state_strs[state_int])
 
     def reset(self, seed=None, options=None):
         # We need the following line to seed self.np_random
         super().reset(seed=seed)
 
-        # Reset to the initial state
-        # a. Randomly set a new target state
+        # start from a get_state snapshot, e.g. reset(options={"state": env.get_state()})
+        if options is not None and "state" in options:
+            return self.set_state(options["state"]), {}
+
+        # a new start distribution stays in effect for the later resets too, autoreset included
+        if options is not None and "start_distribution" in options:
+            self.set_start_distribution(options["start_distribution"], options.get("start_weights"))
+
+        if self.start_alias is not None:
+            # a. draw the start state, Prolog is put there on the first step
+            self.state = sample_alias(self.np_random, *self.start_alias)
+            self.prolog_synced = False
+        else:
+            # a. Issue Prolog query to reset, get back to the initial state, and b. retrieve the
+            # current state from Prolog, in one query so a retry answers for the reset state
+            result = list(self.prolog.query("reset, current_state(State)"))
+            self.prolog_synced = True
+            if result:
+                current_state_string = result[0]['State']
+                self.state = self.states_dict[current_state_string]
+            else:
+                raise RuntimeError("Failed to retrieve current state from Prolog")
+
+        # c. Randomly set a new target state, never the start state
         self.target_state_str = self.get_random_target_state()
         self.target_state = self.states_dict[self.target_state_str]
 
         # Set the target in the display if it exists
-        if self.render_mode == "human":
+        if self.display is not None:
             self.display.target = self.target_state_str
-
-        # b. Issue Prolog query to reset, get back to the initial state
-        self.prolog_thread.query("reset")
-
-        # c. Retrieve the current state from Prolog
-        result = list(self.prolog_thread.query("current_state(State)"))
-        if result:
-            current_state_string = result[0]['State']
-            self.state = self.states_dict[current_state_string]
-        else:
-            raise RuntimeError("Failed to retrieve current state from Prolog")
+            self.display.step(self.get_state_str(self.state))
 
         # Prepare observation
         observation = self.state
@@ -119,22 +194,19 @@ class BlocksWorldEnv(gym.Env):
     def step(self, action):
         # Convert action integer to action string
         action_string = self.actions_dict[action]
-        # a. Issue Prolog query to step/1 predicate
+        self.sync_prolog_state()
+        # a. Issue Prolog query to step/1 predicate and read the new state back in the same
+        # query, so a retry on a restarted server moves from the state it restored
         # for example: step(move(c,a,3)): move c from a to 3
-        step_result = self.prolog_thread.query(f"step({action_string})")
+        step_result = self.prolog.query(f"step({action_string}), current_state(State)")
 
         # b. Check the result of step/1 predicate
         if step_result:
-            # Action was possible, retrieve new state
-            state_result = list(self.prolog_thread.query("current_state(State)"))
-            if state_result:
-                # move and update state
-                current_state_string = state_result[0]['State']
-                self.state = self.states_dict[current_state_string]
-                if self.render_mode == "human":
-                    self.display.step(current_state_string)
-            else:
-                raise RuntimeError("Failed to retrieve current state from Prolog")
+            # Action was possible, move and update state
+            current_state_string = step_result[0]['State']
+            self.state = self.states_dict[current_state_string]
+            if self.display is not None:
+                self.display.step(current_state_string)
             reward = -1
         else:
             # Action was not possible
@@ -157,8 +229,8 @@ class BlocksWorldEnv(gym.Env):
         if self.render_mode is None:
             return
 
-        if self.render_mode == "human":
-            if not hasattr(self, 'display'):
+        if self.render_mode in ("human", "human_async"):
+            if self.display is None:
                 raise RuntimeError("Display not initialized. Make sure to set render_mode='human' in the constructor.")
 
             # Convert current state integer to state string
@@ -168,13 +240,14 @@ class BlocksWorldEnv(gym.Env):
             self.display.step(current_state_string)
 
     def close(self):
-        # shutdown prolog server
-        if self.mqi:
-            self.mqi.stop()
+        # shutdown prolog server, safe to call more than once
+        self.prolog.close()
+
+        # detach from the shared tables
+        if isinstance(self.tables, SharedTables):
+            self.tables.close()
 
         # close pygame
-        if hasattr(self, 'display'):
+        if self.display is not None:
             self.display.close()
-        if self.window is not None:
-            pygame.display.quit()
-            pygame.quit()
+            self.display = None
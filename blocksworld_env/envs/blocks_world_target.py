@@ -1,95 +1,212 @@
 from enum import Enum
 import gymnasium as gym
 from gymnasium import spaces
-import pygame
 import numpy as np
-import random
-from screen import Display
-from swiplserver import PrologMQI,PrologThread
+from screen import AsyncDisplay, Display
+from blocksworld_env.envs.prolog import PrologBackend
+from blocksworld_env.envs.tables import (SharedTables, alias_table, publish_tables, query_actions, query_states,
+                                         query_transitions, sample_alias)
 
 class BlocksWorldTargetEnv(gym.Env):
-    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4}
+    metadata = {"render_modes": ["human", "human_async", "rgb_array"], "render_fps": 4}
+
+    def __init__(self, render_mode=None, size=5, target_distribution="uniform", target_weights=None,
+                 start_distribution=None, start_weights=None, shared_tables=None, query_timeout=5.0, max_retries=2):
+        # nothing to replay into a restarted Prolog server until reset
+        self.config = None
+        self.display = None
+        # False after set_state, until the next step puts Prolog in the restored configuration
+        self.prolog_synced = True
+
+        # Run Prolog interpreter and load blocks world, every query has a deadline and
+        # a hung or crashed server is restarted with the current configuration
+        self.prolog = PrologBackend('blocks_world_target', query_timeout=query_timeout, max_retries=max_retries,
+                                    restore=self.restore_prolog_state)
+
+        if shared_tables is None:
+            # Build the state and action tables from Prolog
+            self.tables = self.build_tables(self.prolog)
+        else:
+            # Attach to the tables the parent process already published, without copying them
+            self.tables = SharedTables.attach(shared_tables)
 
-    def __init__(self, render_mode=None, size=5):
-        # Run Prolog interpreter and load blocks world
-        self.mqi = PrologMQI()
-        self.prolog_thread = self.mqi.create_thread()
-        result = self.prolog_thread.query('[blocks_world_target]')
-        if not result:
-            raise RuntimeError("Could not load blocks_world_target.pl.")
-
-        # Calling query to return all of the possible states
-        prolog_states = self.prolog_thread.query('state(State)')
-
-        # state dict will create a dict like:
-        # {’bc1bc1’:0, ’bc1bc2’:1, …,…}
-        self.states_dict = {state['State']: index for index, state in enumerate(prolog_states)}
-
-        # Set up a dictionary to convert action numbers into prolog actions
-        self.actions_dict = {}
-        # Call query action(A) to get all actions
-        result = self.prolog_thread.query("action(A)")
-        # result is like this, where the first action is move(a,b,c)
-        # [{'A': {'args': ['a', 'b', 'c'], 'functor': 'move'}},...]
-        for i, A in enumerate(result):
-            # get the action name (as a functor)
-            if isinstance(A['A'], str):  # case where {'A': '_'}
-                break
-            else:
-                action_string = A['A']['functor']
-                # indicate the first argument
-                first = True
-                for arg in A['A']['args']:
-                    if first:
-                        # already have a first, next will not be first
-                        first = False
-                        action_string += '('
-                    else:
-                        action_string += ','
-
-                    # concat all arguments into functor predicate
-                    action_string += str(arg)
-                action_string += ')'
-                self.actions_dict[i] = action_string
-
-        # Observation space is the length of state dict
-        self.observation_space = spaces.Discrete(len(self.states_dict))
+        # state strings indexed by the state integer, like 'bc1bc2'
+        self.state_strs = self.tables['states']
+        # state_table[configuration, target] is the state integer of that pair
+        self.configs = self.tables['configs']
+        self.configs_dict = {str(config): index for index, config in enumerate(self.configs)}
+        self.state_table = self.tables['state_table']
+
+        # Set up a dictionary to convert action numbers into prolog actions, like move(a,b,c)
+        self.actions_dict = {index: str(action) for index, action in enumerate(self.tables['actions'])}
+
+        # Observation space is the number of states
+        self.observation_space = spaces.Discrete(len(self.state_strs))
 
         # there is only one action: move
         self.action_space = spaces.Discrete(len(self.actions_dict))
 
-        # initial starting state of the blocks
-        self.state = 0 # the fist state
-        # initial_state will return like 'bc1bc2', so the initial state is the first set of 2 characters
-        self.initial_state_str, _ = self.split_state(self.get_state_str(self.state))
+        # precompute the target distribution for every start configuration once,
+        # so reset only draws one number from the seeded generator
+        self.target_distribution = target_distribution
+        self.target_cdf = self.build_target_cdf(target_distribution, target_weights)
+        # episodes start from Prolog's reset configuration unless a start distribution is set
+        self.set_start_distribution(start_distribution, start_weights)
 
-        # Initial, target is the same as initial state
-        self.target_state_str = self.get_random_target_state()  # will set self.target_state to a random state string
-        self.target_state = self.states_dict[self.target_state_str]
+        # initial starting configuration of the blocks, like '13a'
+        result = list(self.prolog.query("current_state(State)"))
+        if not result:
+            raise RuntimeError("Failed to retrieve current state from Prolog")
+        self.initial_state_str = str(result[0]['State'])
+        self.config = self.configs_dict[self.initial_state_str]
 
-        # Initialize PyGame display if render_mode is "human"
+        # choose random target which is not the start configuration
+        self.target_state_str = self.get_random_target_state()  # will set self.target to a random configuration
+        self.target_state = int(self.state_table[self.target, self.target])
+        self.state = int(self.state_table[self.config, self.target])
+
+        # Initialize PyGame display if render_mode is "human", "human_async" draws in its own
+        # process at render_fps and never makes the env wait for the screen
         self.render_mode = render_mode
         if self.render_mode == "human":
             self.display = Display()
-
-        self.window = None
-        self.clock = None
+        elif self.render_mode == "human_async":
+            self.display = AsyncDisplay(fps=self.metadata["render_fps"])
+
+    @staticmethod
+    def build_tables(prolog):
+        # Calling query to return all of the possible states, like 'bc1bc1', 'bc1bc2', ...
+        states = query_states(prolog)
+
+        # every state is a current configuration followed by a target configuration,
+        # index both halves so a (configuration, target) pair maps straight to a state
+        configs = list(dict.fromkeys(state_str[:3] for state_str in states))
+        configs_dict = {config: index for index, config in enumerate(configs)}
+        state_table = np.empty((len(configs), len(configs)), dtype=np.int64)
+        for index, state_str in enumerate(states):
+            state_table[configs_dict[state_str[:3]], configs_dict[state_str[3:]]] = index
+
+        actions = query_actions(prolog)
+        return {
+            'states': states,
+            'actions': actions,
+            'configs': np.array(configs),
+            'state_table': state_table,
+            # next_configs[config, action] is the configuration the action leads to, -1 if not possible
+            'next_configs': query_transitions(prolog, configs, actions),
+        }
+
+    @classmethod
+    def publish_tables(cls, name=None):
+        # Build the tables once and put them in shared memory, pass tables.handle to
+        # the workers as the shared_tables argument and close the tables after training
+        return publish_tables('blocks_world_target', cls.build_tables, name=name)
+
+    @property
+    def states_dict(self):
+        # {'bc1bc1':0, 'bc1bc2':1, ...}, built on demand from the state strings
+        return {str(state_str): index for index, state_str in enumerate(self.state_strs)}
+
+    def build_target_cdf(self, target_distribution, target_weights=None):
+        # weights[start, target] is the unnormalised probability of drawing target from start
+        num_configs = len(self.configs)
+        if target_distribution == "uniform":
+            weights = np.ones((num_configs, num_configs))
+        elif target_distribution == "weighted":
+            if target_weights is None or len(target_weights) != num_configs:
+                raise ValueError(f"target_weights must give one weight for each of the {num_configs} configurations")
+            weights = np.tile(np.asarray(target_weights, dtype=np.float64), (num_configs, 1))
+        elif target_distribution == "difficulty":
+            # difficulty is the number of blocks that are not on their target support;
+            # draw a difficulty level uniformly, then a target uniformly within that level
+            config_chars = np.array([list(config) for config in self.configs])
+            difficulty = (config_chars[:, None, :] != config_chars[None, :, :]).sum(axis=2)
+            num_levels = config_chars.shape[1] + 1
+            counts = np.stack([(difficulty == level).sum(axis=1) for level in range(num_levels)], axis=1)
+            counts[:, 0] = 0  # level 0 is only the start configuration itself
+            levels_present = (counts > 0).sum(axis=1, keepdims=True)
+            weights = 1.0 / (levels_present * np.maximum(np.take_along_axis(counts, difficulty, axis=1), 1))
+        else:
+            raise ValueError(f"Unknown target distribution: {target_distribution}")
+
+        # the start configuration is never a target
+        np.fill_diagonal(weights, 0.0)
+        if (weights < 0).any() or not (weights.sum(axis=1) > 0).all():
+            raise ValueError("Every start configuration needs at least one target with a positive weight")
+        return np.cumsum(weights, axis=1)
+
+    def set_start_distribution(self, start_distribution=None, start_weights=None):
+        # None: Prolog's reset configuration; "uniform": every configuration; "weighted": one
+        # weight per configuration in start_weights (like inverse visit counts, for exploring
+        # starts); or a list of configurations (indices or strings like '13a') to draw from.
+        # The alias table is built once here, so reset draws a start in O(1)
+        self.start_distribution = start_distribution
+        num_configs = len(self.configs)
+        if start_distribution is None:
+            self.start_alias = None
+            return
+        if isinstance(start_distribution, str) and start_distribution == "uniform":
+            weights = np.ones(num_configs)
+        elif isinstance(start_distribution, str) and start_distribution == "weighted":
+            if start_weights is None or len(start_weights) != num_configs:
+                raise ValueError(f"start_weights must give one weight for each of the {num_configs} configurations")
+            weights = start_weights
+        elif isinstance(start_distribution, str):
+            raise ValueError(f"Unknown start distribution: {start_distribution}")
+        else:
+            starts = [self.configs_dict[start] if isinstance(start, str) else int(start) for start in start_distribution]
+            weights = np.bincount(starts, minlength=num_configs)
+        self.start_alias = alias_table(weights)
+
+    def sample_target(self, config):
+        # inverse transform sampling on the precomputed row, using the env's seeded generator
+        cdf = self.target_cdf[config]
+        return int(np.searchsorted(cdf, self.np_random.random() * cdf[-1], side='right'))
+
+    def restore_prolog_state(self):
+        # Replay the current configuration into a restarted Prolog server
+        if self.config is not None:
+            self.prolog.run(f"set_state({','.join(self.configs[self.config])})")
+
+    def sync_prolog_state(self):
+        # Put Prolog in the current configuration, once, after a set_state
+        if not self.prolog_synced:
+            self.prolog.query(f"set_state({','.join(self.configs[self.config])})")
+            self.prolog_synced = True
+
+    def get_state(self):
+        # Snapshot of everything an episode depends on: the configuration, the target and the
+        # env's generator. Nothing is asked from Prolog, so it is O(1)
+        return {'config': self.config, 'target': self.target, 'rng': self.np_random.bit_generator.state}
+
+    def set_state(self, snapshot):
+        # Restore a get_state snapshot in O(1); Prolog only catches up on the next step, so
+        # a planner can jump between snapshots without any round trips
+        self.config = int(snapshot['config'])
+        self.target = int(snapshot['target'])
+        if 'rng' in snapshot:
+            self.np_random.bit_generator.state = snapshot['rng']
+        self.target_state_str = self.get_state_str(self.state_table[self.target, self.target])
+        self.target_state = int(self.state_table[self.target, self.target])
+        self.state = int(self.state_table[self.config, self.target])
+        self.prolog_synced = False
+
+        if self.display is not None:
+            current_state_str_3c, target_state_3c = self.split_state(self.get_state_str(self.state))
+            self.display.target = target_state_3c
+            self.display.step(current_state_str_3c)
+        return self.state
 
     def get_random_target_state(self):
-        # Get all possible target states (last 3 characters of each state)
-        all_targets = [state[-3:] for state in self.states_dict.keys()]
-
-        # Remove the initial state from possible targets
-        possible_targets = [target for target in all_targets if target != self.initial_state_str[-3:] and len(target) > 2]
+        # Choose a random target configuration for the current start configuration
+        self.target = self.sample_target(self.config)
 
-        # Choose a random target state
-        random_target = random.choice(possible_targets)
-
-        # Combine the current state (first 3 characters of initial state) with the new target
-        return self.initial_state_str[:3] + random_target
+        # The target state pairs the target configuration with itself: the agent has reached
+        # the target once its current configuration is the target configuration
+        return self.get_state_str(self.state_table[self.target, self.target])
 
     def get_state_str(self, state_int):
-        return list(self.states_dict.keys())[list(self.states_dict.values()).index(state_int)]
+        return str(self.state_strs[state_int])
 
     def split_state(self, state_string):
         if len(state_string) != 6:
@@ -104,28 +221,40 @@ class BlocksWorldTargetEnv(gym.Env):
         # We need the following line to seed self.np_random
         super().reset(seed=seed)
 
-        # Reset to the initial state
-        # a. Randomly set a new target state
-        self.target_state_str = self.get_random_target_state() # string 6 characters
-        self.target_state = self.states_dict[self.target_state_str] # integer
-        _, target_state_3c = self.split_state(self.target_state_str)
+        # start from a get_state snapshot, e.g. reset(options={"state": env.get_state()})
+        if options is not None and "state" in options:
+            return self.set_state(options["state"]), {}
 
-        # Set the target in the display if it exists
-        if self.render_mode == "human":
-            self.display.target = target_state_3c
+        # a new start distribution stays in effect for the later resets too, autoreset included
+        if options is not None and "start_distribution" in options:
+            self.set_start_distribution(options["start_distribution"], options.get("start_weights"))
+
+        if self.start_alias is not None:
+            # draw the start configuration, Prolog is put there on the first step
+            self.config = sample_alias(self.np_random, *self.start_alias)
+            self.prolog_synced = False
+        else:
+            # a. Issue Prolog query to reset and b. retrieve the current state from Prolog, in
+            # one query so a retry on a restarted server answers for the reset configuration
+            # the current state remains 3 characters
+            result = list(self.prolog.query("reset, current_state(State)"))
+            self.prolog_synced = True
+            if result:
+                current_state_string = str(result[0]['State'])
+                self.config = self.configs_dict[current_state_string]
+            else:
+                raise RuntimeError("Failed to retrieve current state from Prolog")
 
-        # b. Issue Prolog query to reset
-        self.prolog_thread.query("reset")
+        # c. Randomly set a new target state, never the start configuration
+        self.target_state_str = self.get_random_target_state() # string 6 characters
+        self.target_state = int(self.state_table[self.target, self.target]) # integer
+        self.state = int(self.state_table[self.config, self.target])  # self.state is the index
 
-        # c. Retrieve the current state from Prolog
-        # the current state remains 3 characters
-        result = list(self.prolog_thread.query("current_state(State)"))
-        if result:
-            current_state_string = str(result[0]['State'])
+        # Set the target in the display if it exists
+        if self.display is not None:
             _, target_state_3c = self.split_state(self.target_state_str)
-            self.state = self.states_dict[current_state_string + target_state_3c]  # self.state is the index
-        else:
-            raise RuntimeError("Failed to retrieve current state from Prolog")
+            self.display.target = target_state_3c
+            self.display.step(str(self.configs[self.config]))
 
         # Prepare observation
         observation = self.state
@@ -137,23 +266,20 @@ class BlocksWorldTargetEnv(gym.Env):
     def step(self, action):
         # Convert action integer to action string
         action_string = self.actions_dict[action]
-        # a. Issue Prolog query to step/1 predicate
+        self.sync_prolog_state()
+        # a. Issue Prolog query to step/1 predicate and read the new state back in the same
+        # query, so a retry on a restarted server moves from the configuration it restored
         # for example: step(move(c,a,3)): move c from a to 3
-        step_result = self.prolog_thread.query(f"step({action_string})")
+        step_result = self.prolog.query(f"step({action_string}), current_state(State)")
 
         # b. Check the result of step/1 predicate
         if step_result:
-            # Action was possible, retrieve new state
-            state_result = list(self.prolog_thread.query("current_state(State)"))
-            if state_result:
-                # move and update state
-                current_state_string = state_result[0]['State']
-                _, target_state_3c = self.split_state(self.target_state_str)
-                self.state = self.states_dict[current_state_string + target_state_3c] #self.state is the index
-                if self.render_mode == "human":
-                    self.display.step(current_state_string)
-            else:
-                raise RuntimeError("Failed to retrieve current state from Prolog")
+            # Action was possible, move and update state
+            current_state_string = step_result[0]['State']
+            self.config = self.configs_dict[current_state_string]
+            self.state = int(self.state_table[self.config, self.target]) #self.state is the index
+            if self.display is not None:
+                self.display.step(current_state_string)
             reward = -1
         else:
             # Action was not possible
@@ -177,8 +303,8 @@ class BlocksWorldTargetEnv(gym.Env):
         if self.render_mode is None:
             return
 
-        if self.render_mode == "human":
-            if not hasattr(self, 'display'):
+        if self.render_mode in ("human", "human_async"):
+            if self.display is None:
                 raise RuntimeError("Display not initialized. Make sure to set render_mode='human' in the constructor.")
 
             # Convert current state integer to state string
@@ -188,13 +314,14 @@ class BlocksWorldTargetEnv(gym.Env):
             self.display.step(current_state_str_3c)
 
     def close(self):
-        # shutdown prolog server
-        if self.mqi:
-            self.mqi.stop()
+        # shutdown prolog server, safe to call more than once
+        self.prolog.close()
+
+        # detach from the shared tables
+        if isinstance(self.tables, SharedTables):
+            self.tables.close()
 
         # close pygame
-        if hasattr(self, 'display'):
+        if self.display is not None:
             self.display.close()
-        if self.window is not None:
-            pygame.display.quit()
-            pygame.quit()
+            self.display = None
@@ -0,0 +1,109 @@
+import socket
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from swiplserver import PrologConnectionFailedError, PrologLaunchError, PrologMQI, PrologQueryTimeoutError
+
+
+class PrologServerError(RuntimeError):
+    """The swipl process stopped answering or exited."""
+
+
+# failures that mean the server has to be restarted, a query that is merely false is not one
+SERVER_ERRORS = (PrologServerError, PrologConnectionFailedError, PrologQueryTimeoutError, PrologLaunchError, OSError)
+
+
+def stop_server(mqi, prolog_thread, executor):
+    # kill rather than ask politely: the server may be the thing that is stuck
+    mqi.stop(kill=True)
+    # closing the socket wakes a query still waiting on the dead server
+    sock = prolog_thread._socket
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+    executor.shutdown(wait=False)
+
+
+class PrologBackend:
+    """A swipl process running one blocks world program, with deadlines and restarts.
+
+    Every query runs against a deadline. If the server hangs, crashes or times out it is
+    killed, a new one is started, ``restore`` replays the current configuration into it,
+    and the query is retried up to ``max_retries`` times. The process is always killed on
+    ``close()``, on garbage collection and at interpreter exit.
+    """
+
+    def __init__(self, program, query_timeout=5.0, max_retries=2, restore=None):
+        self.program = program
+        self.query_timeout = query_timeout
+        self.max_retries = max_retries
+        self.restore = restore
+        self.restarts = 0
+        self.mqi = None
+        self.finalizer = None
+        self.start()
+
+    def start(self):
+        # the server cancels goals that run past the timeout itself
+        self.mqi = PrologMQI(query_timeout_seconds=self.query_timeout)
+        self.prolog_thread = self.mqi.create_thread()
+        # queries run on a helper thread, so a dead or hung server can't block past the deadline
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.finalizer = weakref.finalize(self, stop_server, self.mqi, self.prolog_thread, self.executor)
+
+        if not self.run(f'[{self.program}]'):
+            raise RuntimeError(f"Could not load {self.program}.pl.")
+
+    def restart(self):
+        self.stop()
+        self.restarts += 1
+        self.start()
+        if self.restore is not None:
+            self.restore()
+
+    def stop(self):
+        if self.finalizer is not None:
+            self.finalizer()
+            self.finalizer = None
+
+    def alive(self):
+        process = self.mqi._process
+        return process is None or process.poll() is None
+
+    def run(self, value):
+        # one attempt: the answer of the query, or PrologServerError past the deadline
+        if not self.alive():
+            raise PrologServerError(f"swipl exited before running {value}")
+        future = self.executor.submit(self.prolog_thread.query, value)
+        deadline = time.monotonic() + self.query_timeout + 1.0
+        while True:
+            try:
+                return future.result(timeout=0.05)
+            except FutureTimeoutError:
+                if not self.alive():
+                    raise PrologServerError(f"swipl exited while running {value}")
+                if time.monotonic() > deadline:
+                    raise PrologServerError(f"swipl did not answer {value} within {self.query_timeout}s")
+
+    def query(self, value):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                if error is not None:
+                    self.restart()
+                return self.run(value)
+            except SERVER_ERRORS as server_error:
+                error = server_error
+        raise RuntimeError(f"Prolog query {value} failed after {self.max_retries + 1} attempts") from error
+
+    def close(self):
+        self.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
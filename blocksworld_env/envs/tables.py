@@ -0,0 +1,163 @@
+from multiprocessing import shared_memory
+import numpy as np
+from blocksworld_env.envs.prolog import PrologBackend
+
+
+def query_states(prolog):
+    # Calling query to return all of the possible states, in Prolog's order
+    prolog_states = prolog.query('state(State)')
+    return np.array([str(state['State']) for state in prolog_states])
+
+
+def action_string(term):
+    # concat all arguments into functor predicate, like move(a,b,c)
+    return term['functor'] + '(' + ','.join(str(arg) for arg in term['args']) + ')'
+
+
+def query_actions(prolog):
+    # Call query action(A) to get all actions
+    result = prolog.query("action(A)")
+    # result is like this, where the first action is move(a,b,c)
+    # [{'A': {'args': ['a', 'b', 'c'], 'functor': 'move'}},...]
+    actions = []
+    for A in result:
+        # get the action name (as a functor)
+        if isinstance(A['A'], str):  # case where {'A': '_'}
+            break
+        actions.append(action_string(A['A']))
+    return np.array(actions)
+
+
+def query_transitions(prolog, configs, actions):
+    # next_configs[config, action] is the configuration the action leads to, or -1 if the
+    # action is not possible there. Prolog is asked once per configuration for every
+    # possible action and its result, then put back in its initial state. Each query sets
+    # the configuration itself, so a retry on a restarted server answers for the same one.
+    configs_dict = {str(config): index for index, config in enumerate(configs)}
+    actions_dict = {str(action): index for index, action in enumerate(actions)}
+    next_configs = np.full((len(configs), len(actions)), -1, dtype=np.int32)
+    for index, config in enumerate(configs):
+        result = prolog.query(f"set_state({','.join(config)}), action(Act), poss([Act]), on(a,A,[Act]), "
+                              "on(b,B,[Act]), on(c,C,[Act]), atomics_to_string([A,B,C],Next)")
+        for answer in result or []:
+            next_configs[index, actions_dict[action_string(answer['Act'])]] = configs_dict[str(answer['Next'])]
+    prolog.query("reset")
+    return next_configs
+
+
+def state_pairs(state_table):
+    # the (configuration, target) pair of every v1 state index, the inverse of state_table
+    state_table = np.asarray(state_table)
+    num_configs = len(state_table)
+    config = np.empty(state_table.size, dtype=np.int64)
+    target = np.empty(state_table.size, dtype=np.int64)
+    config[state_table] = np.arange(num_configs)[:, None]
+    target[state_table] = np.arange(num_configs)[None, :]
+    return config, target
+
+
+def alias_table(weights):
+    # Walker's alias method: precompute two arrays once so every draw is O(1), one uniform
+    # index and one coin flip, whatever the number of outcomes
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim != 1 or (weights < 0).any() or not weights.sum() > 0:
+        raise ValueError("Weights must be non-negative with a positive sum")
+    num = len(weights)
+    prob = weights * num / weights.sum()
+    alias = np.arange(num)
+    small = [index for index in range(num) if prob[index] < 1.0]
+    large = [index for index in range(num) if prob[index] >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        alias[less] = more
+        prob[more] -= 1.0 - prob[less]
+        (small if prob[more] < 1.0 else large).append(more)
+    # what is left over is 1 up to rounding
+    prob[small + large] = 1.0
+    return prob, alias
+
+
+def sample_alias(rng, prob, alias):
+    index = int(rng.integers(len(prob)))
+    return index if rng.random() < prob[index] else int(alias[index])
+
+
+class SharedTables:
+    """Numpy tables packed into one named shared memory block.
+
+    The parent process builds the tables once and publishes them. Workers attach by
+    name through ``handle`` and get read-only numpy views over the same pages, so
+    adding workers does not copy or rebuild the tables.
+    """
+
+    def __init__(self, shm, layout, owner=False):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {}
+        for key, (dtype, shape, offset) in layout.items():
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            array.flags.writeable = False
+            self.arrays[key] = array
+
+    @classmethod
+    def publish(cls, arrays, name=None):
+        # lay the arrays out back to back, each one aligned to a cache line
+        layout = {}
+        size = 0
+        for key, array in arrays.items():
+            size = -(-size // 64) * 64
+            layout[key] = (array.dtype.str, array.shape, size)
+            size += array.nbytes
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        for key, array in arrays.items():
+            dtype, shape, offset = layout[key]
+            np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)[...] = array
+        return cls(shm, layout, owner=True)
+
+    @classmethod
+    def attach(cls, handle):
+        name, layout = handle
+        try:
+            # the publisher owns the block, so the worker must not unlink it when it exits
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 always tracks the block; workers started by the publishing
+            # process (like SubprocVecEnv workers) share its resource tracker, so this is safe
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, layout)
+
+    @property
+    def handle(self):
+        # small and picklable, pass it to the workers through env_kwargs
+        return self.shm.name, self.layout
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def __contains__(self, key):
+        return key in self.arrays
+
+    def close(self):
+        # drop our views before closing the mapping underneath them
+        self.arrays = {}
+        try:
+            self.shm.close()
+        except BufferError:
+            # views handed out to an env are still alive, the mapping goes away with them
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def publish_tables(program, build_tables, name=None):
+    # Run a Prolog interpreter once, build the tables for program and publish them
+    with PrologBackend(program) as prolog:
+        return SharedTables.publish(build_tables(prolog), name=name)
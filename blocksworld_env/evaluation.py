@@ -0,0 +1,90 @@
+import numpy as np
+
+
+def policy_from_qtable(qtable):
+    # greedy tabular policy: a batch of states in, a batch of actions out
+    qtable = np.asarray(qtable)
+    return lambda states: qtable[states].argmax(axis=1)
+
+
+def policy_from_model(model):
+    # a Stable-Baselines3 model, predicting the whole batch in one call
+    return lambda states: model.predict(states, deterministic=True)[0]
+
+
+def shortest_steps(next_configs):
+    # optimal number of moves between every pair of configurations, by breadth-first
+    # search from all of them at once over the transition table
+    num_configs = len(next_configs)
+    adjacency = np.zeros((num_configs, num_configs), dtype=bool)
+    sources, _ = np.nonzero(next_configs >= 0)
+    adjacency[sources, next_configs[next_configs >= 0]] = True
+
+    distances = np.full((num_configs, num_configs), -1, dtype=np.int64)
+    reached = np.eye(num_configs, dtype=bool)
+    distances[reached] = 0
+    steps = 0
+    while True:
+        steps += 1
+        frontier = (reached.astype(np.int64) @ adjacency.astype(np.int64) > 0) & ~reached
+        if not frontier.any():
+            return distances
+        distances[frontier] = steps
+        reached |= frontier
+
+
+def evaluate(policy, tables, max_steps=100):
+    """Runs a greedy policy from every start configuration to every other target at once.
+
+    ``tables`` are the BlocksWorld-v1 tables (``env.unwrapped.tables`` or published shared
+    tables). All start/target pairs are stepped together through the transition table, with
+    the env's rewards: -1 for a move, -10 for an impossible move and 100 at the target.
+    Returns per-pair arrays and summary numbers.
+    """
+    state_table = np.asarray(tables['state_table'])
+    next_configs = np.asarray(tables['next_configs'])
+    num_configs = len(next_configs)
+
+    # every start/target pair where the start is not already the target
+    start, target = np.nonzero(~np.eye(num_configs, dtype=bool))
+    config = start.copy()
+    steps = np.zeros(len(start), dtype=np.int64)
+    reward = np.zeros(len(start), dtype=np.int64)
+    active = np.ones(len(start), dtype=bool)
+
+    for _ in range(max_steps):
+        indices = np.flatnonzero(active)
+        if len(indices) == 0:
+            break
+        actions = np.asarray(policy(state_table[config[indices], target[indices]]))
+        next_config = next_configs[config[indices], actions]
+        possible = next_config >= 0
+
+        config[indices] = np.where(possible, next_config, config[indices])
+        reached = config[indices] == target[indices]
+        reward[indices] += np.where(reached, 100, np.where(possible, -1, -10))
+        steps[indices] += 1
+        active[indices[reached]] = False
+
+    success = config == target
+    optimal = shortest_steps(next_configs)[start, target]
+    gap = np.where(success, steps - optimal, -1)
+    return {
+        'start': start,
+        'target': target,
+        'success': success,
+        'steps': steps,
+        'reward': reward,
+        'optimal': optimal,
+        'gap': gap,
+        'success_rate': success.mean(),
+        'mean_steps': steps[success].mean() if success.any() else np.nan,
+        'mean_gap': gap[success].mean() if success.any() else np.nan,
+        'optimal_rate': (gap == 0).mean(),
+    }
+
+
+def summary(results):
+    return (f"{len(results['start'])} start/target pairs, success rate: {results['success_rate']:.1%}, "
+            f"mean steps: {results['mean_steps']:.2f}, mean optimality gap: {results['mean_gap']:.2f}, "
+            f"optimal: {results['optimal_rate']:.1%}")
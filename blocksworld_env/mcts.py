@@ -0,0 +1,108 @@
+import math
+import numpy as np
+from blocksworld_env.envs.tables import state_pairs
+
+
+class MCTS:
+    """Monte-Carlo tree search over the BlocksWorld-v1 transition table.
+
+    The search runs on ``next_configs`` instead of Prolog, so a simulation costs a few
+    array lookups. Statistics are kept per (configuration, action), shared by every path
+    reaching a configuration. Simulations run in batches of ``batch_size``: each one
+    descends by UCB with a virtual loss, so the batch spreads over different leaves, then
+    all the leaves are rolled out together with random moves in one vectorized pass.
+    Rewards are the env's: -1 for a move and 100 at the target.
+    """
+
+    def __init__(self, tables, num_simulations=256, batch_size=16, rollout_depth=20, max_depth=30,
+                 exploration=50.0, gamma=0.8, virtual_loss=10.0, seed=None):
+        self.next_configs = np.asarray(tables['next_configs'])
+        self.state_table = np.asarray(tables['state_table'])
+        self.config, self.target = state_pairs(self.state_table)
+        self.num_simulations = num_simulations
+        self.batch_size = batch_size
+        self.rollout_depth = rollout_depth
+        self.max_depth = max_depth
+        self.exploration = exploration
+        self.gamma = gamma
+        self.virtual_loss = virtual_loss
+        self.rng = np.random.default_rng(seed)
+
+        # the possible actions of every configuration, padded to the same length; impossible
+        # moves only cost reward, so the search never considers them
+        possible = self.next_configs >= 0
+        self.num_possible = possible.sum(axis=1)
+        self.possible_actions = np.argsort(~possible, axis=1, kind='stable')[:, :self.num_possible.max()]
+
+    def rollout(self, configs, target):
+        # discounted return of a random walk from each leaf, all leaves at once
+        returns = np.zeros(len(configs))
+        discount = 1.0
+        active = configs != target
+        for _ in range(self.rollout_depth):
+            if not active.any():
+                break
+            choice = (self.rng.random(len(configs)) * self.num_possible[configs]).astype(np.int64)
+            configs = np.where(active, self.next_configs[configs, self.possible_actions[configs, choice]], configs)
+            reached = active & (configs == target)
+            returns += discount * np.where(active, np.where(reached, 100.0, -1.0), 0.0)
+            discount *= self.gamma
+            active &= ~reached
+        return returns
+
+    def select(self, config, visits, values):
+        # UCB over the possible actions, untried actions first
+        actions = self.possible_actions[config, :self.num_possible[config]]
+        counts = visits[config, actions]
+        if (counts == 0).any():
+            return int(actions[np.flatnonzero(counts == 0)[0]])
+        scores = (values[config, actions] / counts
+                  + self.exploration * np.sqrt(math.log(counts.sum()) / counts))
+        return int(actions[scores.argmax()])
+
+    def search(self, config, target):
+        # visit counts and summed returns of the root's actions after the search
+        visits = np.zeros(self.next_configs.shape)
+        values = np.zeros(self.next_configs.shape)
+        expanded = np.zeros(len(self.next_configs), dtype=bool)
+        expanded[config] = True
+
+        for _ in range(math.ceil(self.num_simulations / self.batch_size)):
+            # descend the tree once per simulation in the batch
+            paths, leaves = [], []
+            for _ in range(self.batch_size):
+                path = []
+                current = config
+                while current != target and expanded[current] and len(path) < self.max_depth:
+                    action = self.select(current, visits, values)
+                    path.append((current, action))
+                    # the virtual loss steers the next descents in the batch elsewhere
+                    visits[current, action] += 1
+                    values[current, action] -= self.virtual_loss
+                    current = int(self.next_configs[current, action])
+                expanded[current] = True
+                paths.append(path)
+                leaves.append(current)
+
+            # evaluate every leaf of the batch together, then back the returns up
+            leaf_returns = self.rollout(np.array(leaves), target)
+            for path, value in zip(paths, leaf_returns):
+                for current, action in reversed(path):
+                    reward = 100.0 if self.next_configs[current, action] == target else -1.0
+                    value = reward + self.gamma * value
+                    values[current, action] += value + self.virtual_loss
+        return visits[config], values[config]
+
+    def plan(self, config, target):
+        # the most visited action of the root
+        visits, _ = self.search(config, target)
+        return int(visits.argmax())
+
+    def __call__(self, states):
+        # batch policy over v1 state indices, like the ones evaluation.evaluate passes in
+        return np.array([self.plan(self.config[state], self.target[state]) for state in np.atleast_1d(states)])
+
+    def act(self, env):
+        # plan from the env's current snapshot
+        snapshot = env.unwrapped.get_state()
+        return self.plan(snapshot['config'], snapshot['target'])
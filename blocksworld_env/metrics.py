@@ -0,0 +1,256 @@
+import math
+import os
+from collections import deque
+import numpy as np
+
+# one append-only binary file per column, one row per episode
+COLUMNS = {'reward': np.dtype('<f4'), 'steps': np.dtype('<i4')}
+
+# rows read at a time when scanning a column, so memory stays bounded on long runs
+CHUNK_SIZE = 1 << 20
+
+
+class MetricsSink:
+    """Streams per-episode rewards and steps to disk and keeps rolling aggregates.
+
+    Every column is an append-only binary file inside ``path``, so a reader in another
+    process can follow the run while it trains. Memory use does not grow with the
+    number of episodes.
+    """
+
+    def __init__(self, path, window=100, flush_every=100, resume=False, episodes=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        if resume and episodes is not None:
+            # drop the rows written after the point the run resumes from,
+            # like the episodes after the last checkpoint snapshot
+            for name, dtype in COLUMNS.items():
+                column_path = os.path.join(path, f'{name}.bin')
+                size = os.path.getsize(column_path) if os.path.exists(column_path) else 0
+                if size < episodes * dtype.itemsize:
+                    # rows the run resumes after are missing, the episode numbers would shift
+                    raise ValueError(f"{column_path} has {size // dtype.itemsize} episodes, "
+                                     f"resuming needs at least {episodes}")
+                if size > episodes * dtype.itemsize:
+                    os.truncate(column_path, episodes * dtype.itemsize)
+        self.files = {name: open(os.path.join(path, f'{name}.bin'), 'ab' if resume else 'wb')
+                      for name in COLUMNS}
+
+        # rolling aggregates
+        self.episodes = 0
+        self.recent_rewards = deque(maxlen=window)
+        self.recent_reward_sum = 0.0
+        self.best_reward = -math.inf
+        self.best_episode = None
+        self.min_steps = math.inf
+        self.min_steps_episode = None
+
+        if resume:
+            # pick the aggregates up where the previous run left them
+            reader = MetricsReader(path)
+            self.episodes = len(reader)
+            for reward in reader.read(max(0, self.episodes - window))['reward']:
+                self.recent_rewards.append(float(reward))
+            self.recent_reward_sum = sum(self.recent_rewards)
+            if self.episodes:
+                self.best_reward, self.best_episode = reader.best('reward')
+                self.min_steps, self.min_steps_episode = reader.best('steps', maximize=False)
+
+    def append(self, reward, steps):
+        self.files['reward'].write(COLUMNS['reward'].type(reward).tobytes())
+        self.files['steps'].write(COLUMNS['steps'].type(steps).tobytes())
+        self.episodes += 1
+
+        # update the moving average without keeping the whole history
+        if len(self.recent_rewards) == self.recent_rewards.maxlen:
+            self.recent_reward_sum -= self.recent_rewards[0]
+        self.recent_rewards.append(reward)
+        self.recent_reward_sum += reward
+
+        # episodes are counted from 1, like in the plots
+        if reward > self.best_reward:
+            self.best_reward, self.best_episode = reward, self.episodes
+        if steps < self.min_steps:
+            self.min_steps, self.min_steps_episode = steps, self.episodes
+
+        if self.episodes % self.flush_every == 0:
+            self.flush()
+
+    @property
+    def moving_average(self):
+        if not self.recent_rewards:
+            return math.nan
+        return self.recent_reward_sum / len(self.recent_rewards)
+
+    def summary(self):
+        return (f"{self.episodes} episodes, moving average reward: {self.moving_average:.2f}, "
+                f"max reward: {self.best_reward} at episode {self.best_episode}, "
+                f"min steps: {self.min_steps} at episode {self.min_steps_episode}")
+
+    def flush(self, sync=False):
+        # make the rows written so far visible to readers, and durable with sync
+        for file in self.files.values():
+            file.flush()
+            if sync:
+                os.fsync(file.fileno())
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MetricsReader:
+    """Reads the columns written by a MetricsSink, all at once, downsampled or as they grow."""
+
+    def __init__(self, path):
+        self.path = path
+        # number of rows already returned by read_new
+        self.offset = 0
+
+    def column_path(self, name):
+        return os.path.join(self.path, f'{name}.bin')
+
+    def __len__(self):
+        # a row is complete once every column has it
+        return min(os.path.getsize(self.column_path(name)) // dtype.itemsize
+                   for name, dtype in COLUMNS.items())
+
+    def column(self, name, start=0, stop=None):
+        stop = len(self) if stop is None else stop
+        if stop <= start:
+            return np.empty(0, dtype=COLUMNS[name])
+        return np.memmap(self.column_path(name), dtype=COLUMNS[name], mode='r', shape=(stop,))[start:stop]
+
+    def read(self, start=0, stop=None):
+        stop = len(self) if stop is None else stop
+        return {name: np.array(self.column(name, start, stop)) for name in COLUMNS}
+
+    def read_new(self):
+        # the rows appended since the last call
+        stop = len(self)
+        rows = self.read(self.offset, stop)
+        self.offset = stop
+        return rows
+
+    def downsampled(self, max_points=2000):
+        # episode numbers (counted from 1) and the mean of each column over equal blocks
+        # of episodes, computed chunk by chunk so long runs are never loaded whole
+        episodes = len(self)
+        block = max(1, math.ceil(episodes / max_points))
+        chunk = max(block, CHUNK_SIZE // block * block)
+        points = {name: [] for name in COLUMNS}
+        for start in range(0, episodes, chunk):
+            stop = min(episodes, start + chunk)
+            for name in COLUMNS:
+                values = self.column(name, start, stop).astype(np.float64)
+                full = len(values) // block * block
+                means = values[:full].reshape(-1, block).mean(axis=1)
+                if full < len(values):
+                    means = np.append(means, values[full:].mean())
+                points[name].append(means)
+        # plot each block at its middle episode
+        starts = np.arange(0, episodes, block)
+        x = starts + (np.minimum(block, episodes - starts) + 1) / 2
+        return x, {name: np.concatenate(parts) if parts else np.empty(0) for name, parts in points.items()}
+
+    def best(self, name, maximize=True):
+        # (value, episode) of the first best row of a column, scanning chunk by chunk
+        best_value, best_episode = None, None
+        episodes = len(self)
+        for start in range(0, episodes, CHUNK_SIZE):
+            values = self.column(name, start, min(episodes, start + CHUNK_SIZE))
+            index = int(np.argmax(values) if maximize else np.argmin(values))
+            value = values[index].item()
+            if best_value is None or (value > best_value if maximize else value < best_value):
+                best_value, best_episode = value, start + index + 1
+        return best_value, best_episode
+
+
+def draw_training_result(axes, reader, max_points=2000):
+    ax1, ax2 = axes
+    episodes_range, points = reader.downsampled(max_points)
+    for ax in axes:
+        ax.clear()
+
+    # Rewards plot
+    ax1.plot(episodes_range, points['reward'], alpha=0.5)
+    ax1.set_title('Rewards per Episode')
+    ax1.set_xlabel('Episode')
+    ax1.set_ylabel('Total Reward')
+    ax1.grid(True, linestyle='--', alpha=0.7)
+
+    # Steps plot
+    ax2.plot(episodes_range, points['steps'], alpha=0.5)
+    ax2.set_title('Steps per Episode')
+    ax2.set_xlabel('Episode')
+    ax2.set_ylabel('Number of Steps')
+    ax2.grid(True, linestyle='--', alpha=0.7)
+
+    # Add annotations
+    if len(reader):
+        max_reward, max_reward_episode = reader.best('reward')
+        min_steps, min_steps_episode = reader.best('steps', maximize=False)
+        ax1.annotate(f'Max reward: {max_reward:g} at episode {max_reward_episode}',
+                     xy=(0.05, 0.95), xycoords='axes fraction')
+        ax2.annotate(f'Min steps: {min_steps} at episode {min_steps_episode}',
+                     xy=(0.05, 0.95), xycoords='axes fraction')
+
+
+def make_training_figure(hyperparams, title):
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, 2, figsize=(15, 6))
+    fig.suptitle(title, fontsize=16, fontweight='bold')
+
+    # Add hyperparameters text box
+    hyperparams_text = "Hyperparameters:\n\n" + "\n".join(f"{name} = {value}" for name, value in hyperparams.items())
+    fig.text(0.87, 0.87, hyperparams_text, verticalalignment='top', horizontalalignment='left',
+             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
+    return fig, axes
+
+
+def plot_training_result(path, hyperparams, title, filename=None, max_points=2000, show=True):
+    import matplotlib.pyplot as plt
+
+    fig, axes = make_training_figure(hyperparams, title)
+    draw_training_result(axes, MetricsReader(path), max_points)
+
+    plt.tight_layout()
+    plt.subplots_adjust(top=0.88, right=0.85)  # Adjust right to make room for the text box
+    if filename is not None:
+        plt.savefig(filename)
+    if show:
+        plt.show()
+    return fig
+
+
+def watch_training(path, hyperparams, title, interval=2.0, max_points=2000):
+    # Redraw the plot from the metrics files while another process is still training,
+    # until the window is closed
+    import matplotlib.pyplot as plt
+
+    plt.ion()
+    fig, axes = make_training_figure(hyperparams, title)
+    reader = MetricsReader(path)
+    drawn = -1
+    while plt.fignum_exists(fig.number):
+        if len(reader) != drawn:
+            drawn = len(reader)
+            draw_training_result(axes, reader, max_points)
+            fig.tight_layout()
+            fig.subplots_adjust(top=0.88, right=0.85)
+        plt.pause(interval)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m blocksworld_env.metrics <metrics dir> to follow a run live
+    watch_training(sys.argv[1], {}, sys.argv[1])
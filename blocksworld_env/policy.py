@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import threading
+from multiprocessing.connection import Client, Listener
+import numpy as np
+from numpy.lib.format import open_memmap
+from blocksworld_env.checkpoint import fsync_dir, save_atomic, write_atomic
+from blocksworld_env.distributed import AUTHKEY, authkey_from_args, check_authkey
+
+# states passed to the agent's policy at a time while exporting
+EXPORT_BATCH = 4096
+
+
+def action_dtype(num_actions):
+    # the smallest integer type that holds every action index
+    return np.int8 if num_actions <= np.iinfo(np.int8).max + 1 else np.int16
+
+
+def export_policy(path, policy, num_states, num_actions, values=None, **metadata):
+    """Distils a trained agent into a compact, memory-mappable policy directory.
+
+    ``policy`` is any batch policy, like ``evaluation.policy_from_qtable`` or
+    ``policy_from_model``: it is asked for the greedy action of every state once, and the
+    answers are stored as one int8/int16 per state in ``actions.npy``. ``values`` (like the
+    max Q-value of every state) go to ``values.npy`` as float32. Extra keyword arguments are
+    written to ``meta.json`` with the sizes, which is written last and marks the export complete.
+    Every file is written under a temporary name, fsynced and renamed into place, and the
+    previous ``meta.json`` is removed first, so a reader never pairs new arrays with old metadata.
+    """
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, 'meta.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+        fsync_dir(path)
+
+    actions_path = os.path.join(path, 'actions.npy')
+    actions = open_memmap(actions_path + '.tmp', mode='w+', dtype=action_dtype(num_actions), shape=(num_states,))
+    for start in range(0, num_states, EXPORT_BATCH):
+        states = np.arange(start, min(num_states, start + EXPORT_BATCH))
+        actions[states] = np.asarray(policy(states))
+    actions.flush()
+    del actions
+    with open(actions_path + '.tmp', 'rb') as file:
+        os.fsync(file.fileno())
+    os.replace(actions_path + '.tmp', actions_path)
+
+    values_path = os.path.join(path, 'values.npy')
+    if values is not None:
+        save_atomic(values_path, np.asarray(values, dtype=np.float32))
+    elif os.path.exists(values_path):
+        # left over from an earlier export with values
+        os.remove(values_path)
+    meta = dict(metadata, num_states=num_states, num_actions=num_actions, values=values is not None)
+    # also makes the renames above durable
+    write_atomic(meta_path, json.dumps(meta))
+    return meta
+
+
+def export_qtable(path, qtable, **metadata):
+    # greedy actions and state values of a tabular agent
+    qtable = np.asarray(qtable)
+    return export_policy(path, lambda states: qtable[states].argmax(axis=1), *qtable.shape,
+                         values=qtable.max(axis=1), **metadata)
+
+
+class CompactPolicy:
+    """A policy exported by ``export_policy``, answering whole batches with one lookup.
+
+    The arrays are memory-mapped, so loading is O(1) and processes serving the same
+    export share its pages. Calling the policy is ``predict_batch``, so it can be passed
+    to ``evaluation.evaluate`` like the agent it was distilled from.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as file:
+            self.meta = json.load(file)
+        self.actions = open_memmap(os.path.join(path, 'actions.npy'), mode='r')
+        self.values = open_memmap(os.path.join(path, 'values.npy'), mode='r') if self.meta['values'] else None
+
+    def predict_batch(self, observations):
+        return self.actions[np.asarray(observations)]
+
+    def value_batch(self, observations):
+        if self.values is None:
+            raise ValueError(f"The policy in {self.path} was exported without values")
+        return self.values[np.asarray(observations)]
+
+    def __call__(self, observations):
+        return self.predict_batch(observations)
+
+
+def handle_client(policy, conn):
+    # one batch of observations in, the batch of actions out, until the client hangs up
+    with conn:
+        while True:
+            try:
+                observations = conn.recv()
+            except EOFError:
+                return
+            conn.send(policy.predict_batch(observations))
+
+
+def serve_policy(policy, address=('localhost', 6001), authkey=AUTHKEY, ready=None):
+    # Answer predict_batch calls from other processes, one thread per client
+    check_authkey(address, authkey)
+    with Listener(address, authkey=authkey) as listener:
+        if ready is not None:
+            ready(listener.address)
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=handle_client, args=(policy, conn), daemon=True).start()
+
+
+class PolicyClient:
+    """Queries a policy served by ``serve_policy`` from another process."""
+
+    def __init__(self, address=('localhost', 6001), authkey=AUTHKEY):
+        check_authkey(address, authkey)
+        self.conn = Client(address, authkey=authkey)
+
+    def predict_batch(self, observations):
+        self.conn.send(np.asarray(observations))
+        return self.conn.recv()
+
+    def __call__(self, observations):
+        return self.predict_batch(observations)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve an exported blocks world policy")
+    parser.add_argument('path')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6001)
+    parser.add_argument('--authkey', default=None, help="shared secret, required unless --host is loopback")
+    args = parser.parse_args()
+    authkey = authkey_from_args(parser, args.host, args.authkey)
+    serve_policy(CompactPolicy(args.path), (args.host, args.port), authkey)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from itertools import permutations
+import numpy as np
+from blocksworld_env.envs.tables import state_pairs
+
+BLOCKS = 'abc'
+PLACES = '1234'
+
+
+def relabelings():
+    # every renaming of the blocks combined with every renaming of the places, as a
+    # symbol -> symbol dict; the identity comes first
+    return [dict(zip(BLOCKS + PLACES, blocks + places))
+            for blocks in permutations(BLOCKS) for places in permutations(PLACES)]
+
+
+def relabel_config(config, mapping):
+    # config[i] is what block i stands on; after renaming, block mapping[i] stands on mapping[config[i]]
+    relabeled = [''] * len(BLOCKS)
+    for block, support in zip(BLOCKS, config):
+        relabeled[BLOCKS.index(mapping[block])] = mapping[support]
+    return ''.join(relabeled)
+
+
+def relabel_action(action, mapping):
+    # move(a,1,b) -> move(mapping[a],mapping[1],mapping[b])
+    args = action[action.index('(') + 1:-1].split(',')
+    return action[:action.index('(')] + '(' + ','.join(mapping[arg] for arg in args) + ')'
+
+
+class Symmetry:
+    """The BlocksWorld-v1 state space up to renaming the blocks and the places.
+
+    The four places are interchangeable, and so are the blocks once the target is renamed
+    together with the current configuration, so every (configuration, target) state is
+    equivalent to a canonical one: the lowest state index it can be renamed to. Canonical
+    states are numbered 0 .. num_classes - 1. For every state, ``element[state]`` is the
+    renaming that takes it to its canonical state, and ``action_perm`` / ``inverse_action_perm``
+    carry actions between the env's labels and the canonical labels.
+    """
+
+    def __init__(self, tables):
+        if 'state_table' not in tables:
+            raise ValueError("Symmetry reduction needs the target in the state, use BlocksWorld-v1")
+        configs = [str(config) for config in tables['configs']]
+        actions = [str(action) for action in tables['actions']]
+        state_table = np.asarray(tables['state_table'])
+        next_configs = np.asarray(tables['next_configs'])
+        configs_dict = {config: index for index, config in enumerate(configs)}
+        actions_dict = {action: index for index, action in enumerate(actions)}
+
+        # config_perm[g, config] and action_perm[g, action] are their renamings under element g
+        mappings = relabelings()
+        config_perm = np.array([[configs_dict[relabel_config(config, mapping)] for config in configs]
+                                for mapping in mappings])
+        self.action_perm = np.array([[actions_dict[relabel_action(action, mapping)] for action in actions]
+                                     for mapping in mappings])
+        self.inverse_action_perm = np.argsort(self.action_perm, axis=1)
+
+        # the configuration and target of every state
+        num_states = state_table.size
+        state_config, state_target = state_pairs(state_table)
+        # state_perm[g, state]: rename the configuration and the target together
+        state_perm = state_table[config_perm[:, state_config], config_perm[:, state_target]]
+
+        # the canonical state is the smallest renamed index, element is the renaming reaching it
+        self.element = state_perm.argmin(axis=0)
+        representative = state_perm[self.element, np.arange(num_states)]
+        self.representatives, self.canonical_id = np.unique(representative, return_inverse=True)
+        self.num_states = num_states
+        self.num_classes = len(self.representatives)
+        self.num_actions = len(actions)
+
+        # the quotient MDP: next_canonical[c, a] is the canonical state action a (in canonical
+        # labels) leads to from canonical state c, -1 if it is not possible there
+        rep_config = state_config[self.representatives]
+        rep_target = state_target[self.representatives]
+        next_config = next_configs[rep_config]
+        next_state = state_table[np.maximum(next_config, 0), rep_target[:, None]]
+        self.next_canonical = np.where(next_config >= 0, self.canonical_id[next_state], -1)
+        self.terminal = rep_config == rep_target
+
+    def observation(self, states):
+        # env state indices -> canonical state indices
+        return self.canonical_id[states]
+
+    def to_canonical(self, states, actions):
+        # env actions taken in states -> the same actions in canonical labels
+        return self.action_perm[self.element[states], actions]
+
+    def to_env(self, states, actions):
+        # actions chosen in canonical labels for states -> the env actions to take
+        return self.inverse_action_perm[self.element[states], actions]
+
+    def lift(self, qtable):
+        # Q-table over canonical states -> Q-table over every env state
+        qtable = np.asarray(qtable)
+        return qtable[self.canonical_id[:, None], self.action_perm[self.element]]
+
+    def value_iteration(self, gamma=0.9, tol=1e-8, max_iterations=10_000):
+        # Q-values of the canonical states by dynamic programming, with the env's rewards:
+        # -1 for a move, -10 for an impossible move (staying put) and 100 at the target
+        possible = self.next_canonical >= 0
+        next_state = np.where(possible, self.next_canonical, np.arange(self.num_classes)[:, None])
+        reached = self.terminal[next_state] & possible
+        reward = np.where(reached, 100.0, np.where(possible, -1.0, -10.0))
+        # the target has no future
+        continues = ~reached
+
+        qtable = np.zeros((self.num_classes, self.num_actions))
+        for _ in range(max_iterations):
+            values = qtable.max(axis=1)
+            updated = reward + gamma * continues * values[next_state]
+            updated[self.terminal] = 0.0
+            if np.abs(updated - qtable).max() < tol:
+                return updated
+            qtable = updated
+        return qtable
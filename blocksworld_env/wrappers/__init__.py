@@ -2,3 +2,10 @@ from blocksworld_env.wrappers.clip_reward import ClipReward
 from blocksworld_env.wrappers.discrete_actions import DiscreteActions
 from blocksworld_env.wrappers.reacher_weighted_reward import ReacherRewardWrapper
 from blocksworld_env.wrappers.relative_position import RelativePosition
+from blocksworld_env.wrappers.vector_clip_reward import VectorClipReward
+from blocksworld_env.wrappers.vector_discrete_actions import VectorDiscreteActions
+from blocksworld_env.wrappers.vector_reacher_weighted_reward import VectorReacherRewardWrapper
+from blocksworld_env.wrappers.vector_relative_position import VectorRelativePosition
+from blocksworld_env.wrappers.blocks_observation import BlocksObservation, VectorBlocksObservation
+from blocksworld_env.wrappers.target_reward_shaping import TargetRewardShaping, VectorTargetRewardShaping
+from blocksworld_env.wrappers.symmetry_reduction import SymmetryReduction
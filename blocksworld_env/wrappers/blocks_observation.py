@@ -0,0 +1,71 @@
+import gymnasium as gym
+from gymnasium.spaces import Box
+from gymnasium.vector.utils import batch_space
+import numpy as np
+
+# everything a block can sit on
+SUPPORTS = 'abc1234'
+
+
+def blocks_features(state_strs):
+    # one-hot of the support of each block, for every character of the state string:
+    # 'bc2' gives 3 groups, 'bc1bc2' gives 6 groups (current configuration, then target)
+    chars = np.array([list(state_str) for state_str in state_strs])
+    features = chars[:, :, None] == np.array(list(SUPPORTS))
+    return features.reshape(len(state_strs), -1).astype(np.float32)
+
+
+def vector_state_strs(env):
+    # every sub-environment has the same states: read them from the first one only, through
+    # the base vector env so the vector wrappers can be stacked
+    env = env.unwrapped
+    if hasattr(env, "envs"):
+        return env.envs[0].unwrapped.state_strs
+    # AsyncVectorEnv cannot address a single worker
+    return env.get_attr("state_strs")[0]
+
+
+class BlocksEncoder:
+    """Encodes batches of state integers as feature vectors with one table lookup."""
+
+    def __init__(self, state_strs, encoding="features"):
+        self.num_states = len(state_strs)
+        if encoding == "features":
+            self.table = blocks_features(state_strs)
+            size = self.table.shape[1]
+        elif encoding == "onehot":
+            # too large to precompute for BlocksWorld-v1, built per batch instead
+            self.table = None
+            size = self.num_states
+        else:
+            raise ValueError(f"Unknown encoding: {encoding}")
+        self.space = Box(low=0.0, high=1.0, shape=(size,), dtype=np.float32)
+
+    def __call__(self, observations):
+        observations = np.asarray(observations)
+        if self.table is not None:
+            return self.table[observations]
+        encoded = np.zeros(observations.shape + (self.num_states,), dtype=np.float32)
+        np.put_along_axis(encoded, observations[..., None], 1.0, axis=-1)
+        return encoded
+
+
+class BlocksObservation(gym.ObservationWrapper):
+    def __init__(self, env, encoding="features"):
+        super().__init__(env)
+        self.encoder = BlocksEncoder(env.unwrapped.state_strs, encoding)
+        self.observation_space = self.encoder.space
+
+    def observation(self, obs):
+        return self.encoder(obs)
+
+
+class VectorBlocksObservation(gym.vector.VectorObservationWrapper):
+    def __init__(self, env, encoding="features"):
+        super().__init__(env)
+        self.encoder = BlocksEncoder(vector_state_strs(env), encoding)
+        self.single_observation_space = self.encoder.space
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+
+    def observations(self, observations):
+        return self.encoder(observations)
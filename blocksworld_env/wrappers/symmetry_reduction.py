@@ -0,0 +1,30 @@
+import gymnasium as gym
+from gymnasium import spaces
+from blocksworld_env.symmetry import Symmetry
+
+
+class SymmetryReduction(gym.Wrapper):
+    """Observations and actions in the symmetry-reduced state space of BlocksWorld-v1.
+
+    Observations are canonical state indices and actions are taken in the canonical
+    labels, then renamed back for the env, so a tabular agent learns one row per class
+    of equivalent states instead of one per labelled state.
+    """
+
+    def __init__(self, env, symmetry=None):
+        super().__init__(env)
+        self.symmetry = Symmetry(env.unwrapped.tables) if symmetry is None else symmetry
+        self.observation_space = spaces.Discrete(self.symmetry.num_classes)
+        self.state = None
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self.state = obs
+        info["state"] = obs
+        return int(self.symmetry.observation(obs)), info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(int(self.symmetry.to_env(self.state, action)))
+        self.state = obs
+        info["state"] = obs
+        return int(self.symmetry.observation(obs)), reward, terminated, truncated, info
@@ -0,0 +1,70 @@
+import gymnasium as gym
+from gymnasium.vector import AutoresetMode
+import numpy as np
+from blocksworld_env.wrappers.blocks_observation import vector_state_strs
+
+
+def target_potential(state_strs):
+    # minus the number of blocks that are not on their target support, 0 at the target
+    chars = np.array([list(state_str) for state_str in state_strs])
+    if chars.shape[1] != 6:
+        raise ValueError("Target reward shaping needs the target in the state, use BlocksWorld-v1")
+    return -(chars[:, :3] != chars[:, 3:]).sum(axis=1).astype(np.float32)
+
+
+class TargetRewardShaping(gym.Wrapper):
+    """Potential-based reward shaping towards the target configuration.
+
+    Adds weight * (gamma * phi(s') - phi(s)) to every reward, where phi is minus the number
+    of misplaced blocks. Potential-based shaping leaves the optimal policy unchanged.
+    """
+
+    def __init__(self, env, gamma=0.99, weight=1.0):
+        super().__init__(env)
+        self.gamma = gamma
+        self.weight = weight
+        self.potential = target_potential(env.unwrapped.state_strs)
+        self.last_potential = 0.0
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self.last_potential = self.potential[obs]
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        # the terminal state has no future, its potential is 0
+        potential = 0.0 if terminated else self.potential[obs]
+        reward = reward + self.weight * (self.gamma * potential - self.last_potential)
+        self.last_potential = self.potential[obs]
+        return obs, reward, terminated, truncated, info
+
+
+class VectorTargetRewardShaping(gym.vector.VectorWrapper):
+    """TargetRewardShaping for a whole batch of sub-environments at once."""
+
+    def __init__(self, env, gamma=0.99, weight=1.0):
+        super().__init__(env)
+        if env.metadata.get("autoreset_mode", AutoresetMode.NEXT_STEP) not in (AutoresetMode.NEXT_STEP, AutoresetMode.DISABLED):
+            raise ValueError(f"Expected autoreset_mode to be NEXT_STEP or DISABLED, got {env.metadata['autoreset_mode']}")
+        self.gamma = gamma
+        self.weight = weight
+        self.potential = target_potential(vector_state_strs(env))
+        self.last_potential = np.zeros(self.num_envs, dtype=np.float32)
+        self.autoreset = np.zeros(self.num_envs, dtype=bool)
+
+    def reset(self, *, seed=None, options=None):
+        observations, infos = self.env.reset(seed=seed, options=options)
+        self.last_potential = self.potential[observations]
+        self.autoreset = np.zeros(self.num_envs, dtype=bool)
+        return observations, infos
+
+    def step(self, actions):
+        observations, rewards, terminations, truncations, infos = self.env.step(actions)
+        potential = np.where(terminations, 0.0, self.potential[observations])
+        shaping = self.weight * (self.gamma * potential - self.last_potential)
+        # sub-environments that were reset on this step did not move, leave their reward alone
+        rewards = rewards + np.where(self.autoreset, 0.0, shaping)
+        self.last_potential = self.potential[observations]
+        self.autoreset = np.logical_or(terminations, truncations)
+        return observations, rewards, terminations, truncations, infos
@@ -0,0 +1,13 @@
+import gymnasium as gym
+import numpy as np
+
+
+class VectorClipReward(gym.vector.VectorRewardWrapper):
+    def __init__(self, env, min_reward, max_reward):
+        super().__init__(env)
+        self.min_reward = min_reward
+        self.max_reward = max_reward
+
+    def rewards(self, rewards):
+        # one clip over the rewards of every sub-environment
+        return np.clip(rewards, self.min_reward, self.max_reward)
@@ -0,0 +1,16 @@
+import gymnasium as gym
+from gymnasium.spaces import Discrete
+from gymnasium.vector.utils import batch_space
+import numpy as np
+
+
+class VectorDiscreteActions(gym.vector.VectorActionWrapper):
+    def __init__(self, env, disc_to_cont):
+        super().__init__(env)
+        # as an array, so a batch of actions is converted with one fancy index
+        self.disc_to_cont = np.asarray(disc_to_cont)
+        self.single_action_space = Discrete(len(disc_to_cont))
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+
+    def actions(self, actions):
+        return self.disc_to_cont[np.asarray(actions)]
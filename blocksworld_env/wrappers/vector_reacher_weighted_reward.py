@@ -0,0 +1,17 @@
+import gymnasium as gym
+
+
+class VectorReacherRewardWrapper(gym.vector.VectorWrapper):
+    def __init__(self, env, reward_dist_weight, reward_ctrl_weight):
+        super().__init__(env)
+        self.reward_dist_weight = reward_dist_weight
+        self.reward_ctrl_weight = reward_ctrl_weight
+
+    def step(self, actions):
+        # the vector env batches the info entries, so this weighs every sub-environment at once
+        observations, _, terminations, truncations, infos = self.env.step(actions)
+        rewards = (
+            self.reward_dist_weight * infos["reward_dist"]
+            + self.reward_ctrl_weight * infos["reward_ctrl"]
+        )
+        return observations, rewards, terminations, truncations, infos
@@ -0,0 +1,15 @@
+import gymnasium as gym
+from gymnasium.spaces import Box
+from gymnasium.vector.utils import batch_space
+import numpy as np
+
+
+class VectorRelativePosition(gym.vector.VectorObservationWrapper):
+    def __init__(self, env):
+        super().__init__(env)
+        self.single_observation_space = Box(shape=(2,), low=-np.inf, high=np.inf)
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+
+    def observations(self, observations):
+        # the dict entries are already batched, shape (num_envs, 2)
+        return observations["target"] - observations["agent"]
@@ -1,28 +1,38 @@
 import gymnasium as gym
 import blocksworld_env
+from blocksworld_env.envs import BlocksWorldTargetEnv
+from blocksworld_env.evaluation import evaluate, policy_from_model, summary
+from blocksworld_env.policy import export_policy
 
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_util import make_vec_env
 from stable_baselines3.common.vec_env import SubprocVecEnv
 
 def train_and_run():
-    # Parallel environments
-    env = make_vec_env("blocksworld_env/BlocksWorld-v1", n_envs=4, vec_env_cls=SubprocVecEnv)
+    # Build the state and action tables once, the workers attach to them by name;
+    # the shared memory is released even if training fails
+    with BlocksWorldTargetEnv.publish_tables() as tables:
+        # Parallel environments
+        env = make_vec_env("blocksworld_env/BlocksWorld-v1", n_envs=4, vec_env_cls=SubprocVecEnv,
+                           env_kwargs={"shared_tables": tables.handle})
+        try:
+            model = PPO("MlpPolicy", env, device="cpu", verbose=1)
+            model.learn(total_timesteps=25_000)
+            model.save("ppo_blocks")
+        finally:
+            env.close()
 
-    model = PPO("MlpPolicy", env, device="cpu", verbose=1)
-    model.learn(total_timesteps=25_000)
-    model.save("ppo_blocks")
+        del model  # remove to demonstrate saving and loading
 
-    del model  # remove to demonstrate saving and loading
+        model = PPO.load("ppo_blocks")
 
-    model = PPO.load("ppo_blocks")
+        # Run the trained policy from every start configuration to every target at once
+        results = evaluate(policy_from_model(model), tables)
+        print(summary(results))
 
-    obs = env.reset()
-    while True:
-        action, _states = model.predict(obs)
-        obs, rewards, dones, info = env.step(action)
-        print(f"action:{action} and rewards: {rewards}")
-        #env.render("human")
+        # Distil the model into one action per state, serve it with: python -m blocksworld_env.policy ppo_blocks_policy
+        export_policy("ppo_blocks_policy", policy_from_model(model), tables['state_table'].size, len(tables['actions']),
+                      env_id="blocksworld_env/BlocksWorld-v1", source="ppo_blocks.zip")
 
 if __name__ == "__main__":
     train_and_run()
\ No newline at end of file
@@ -1,5 +1,15 @@
 # import the pygame module, so you can use it
+import os
+import struct
+import subprocess
+import sys
+import weakref
+from multiprocessing import resource_tracker, shared_memory
 import pygame
+
+# layout of the AsyncDisplay buffer
+RUNNING_OFFSET = 8
+FRAME_OFFSET = 9
  
 class Display():
     def __init__(self):
@@ -144,6 +154,97 @@ class Display():
     def close(self):
         pygame.quit()
 
+class AsyncDisplay():
+    """Draws the blocks in its own process, so stepping the env never waits for the screen.
+
+    The env overwrites a single-slot shared buffer with the latest state and the display
+    process draws whatever is in it at fps frames per second, so intermediate states are
+    dropped. The slot is guarded by a sequence number instead of a lock: it is odd while
+    a write is in progress, and a reader that sees it change retries on the next frame.
+    """
+    def __init__(self, fps=4):
+        # sequence number, running flag, then 3 characters for the current configuration
+        # and 3 for the target
+        self.shm = shared_memory.SharedMemory(create=True, size=FRAME_OFFSET + 6)
+        self.shm.buf[RUNNING_OFFSET] = 1
+        self.state = ""
+        self._target = ""
+        # a fresh interpreter running this file, rather than a multiprocessing child that
+        # would re-import (and re-run) the training script
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--async",
+                                         self.shm.name, str(fps), str(os.getpid())])
+        # stop the display and free the block on close(), garbage collection or interpreter exit
+        self.finalizer = weakref.finalize(self, stop_async_display, self.shm, self.process)
+
+    @property
+    def target(self):
+        return self._target
+
+    @target.setter
+    def target(self, target):
+        self._target = target
+        self.publish()
+
+    def step(self,state):
+        self.state = state
+        self.publish()
+
+    def publish(self):
+        if len(self.state) != 3 or len(self._target) != 3:
+            return
+        sequence = read_sequence(self.shm.buf)
+        write_sequence(self.shm.buf, sequence + 1)
+        self.shm.buf[FRAME_OFFSET:FRAME_OFFSET + 6] = (self.state + self._target).encode()
+        write_sequence(self.shm.buf, sequence + 2)
+
+    def close(self):
+        self.finalizer()
+
+def stop_async_display(shm, process):
+    shm.buf[RUNNING_OFFSET] = 0
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    shm.close()
+    shm.unlink()
+
+def read_sequence(buf):
+    # through struct rather than a cast memoryview, which would keep the block from closing
+    return struct.unpack_from('Q', buf)[0]
+
+def write_sequence(buf, sequence):
+    struct.pack_into('Q', buf, 0, sequence)
+
+def run_async_display(name, fps, parent):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        # the env already exited and its block went with it
+        return
+    # the env owns the block, don't let this process's resource tracker remove it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    display = Display()
+    clock = pygame.time.Clock()
+    drawn = 0
+    # stop when the env closes the display or goes away without closing it
+    while shm.buf[RUNNING_OFFSET] and display.running and os.getppid() == parent:
+        current = read_sequence(shm.buf)
+        frame = bytes(shm.buf[FRAME_OFFSET:FRAME_OFFSET + 6]).decode()
+        # draw only a new frame that was not being written while we copied it
+        if current != drawn and current % 2 == 0 and read_sequence(shm.buf) == current:
+            drawn = current
+            display.target = frame[3:]
+            display.step(frame[:3])
+        else:
+            # keep the window responsive while there is nothing new to draw
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    display.running = False
+        clock.tick(fps)
+    display.close()
+    shm.close()
+
 def main():
    display = Display()
    display.start()
@@ -151,5 +252,9 @@ def main():
 # run the main function only if this module is executed as the main script
 # (if you import this as a module then nothing is executed)
 if __name__=="__main__":
-    # call the main function
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "--async":
+        # started by AsyncDisplay
+        run_async_display(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+    else:
+        # call the main function
+        main()